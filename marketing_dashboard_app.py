@@ -3,19 +3,145 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import duckdb
+import os
 from datetime import timedelta
 
 st.set_page_config(layout="wide", page_title="Marketing Intelligence Dashboard (Prototype)")
 
-@st.cache_data
+def _ensure_parquet(csv_path):
+    """Convert a CSV to a sibling Parquet file once; return the Parquet path.
+
+    Parquet gives dictionary-encoded strings and compressed columnar reads,
+    so the cold load is far cheaper than re-parsing the CSV every time.
+    """
+    pq_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(pq_path):
+        df = pd.read_csv(csv_path, parse_dates=['date'])
+        df['date'] = df['date'].astype('datetime64[ns]')
+        cats = {c: 'category' for c in ('channel', 'campaign', 'state') if c in df.columns}
+        df.astype(cats).to_parquet(pq_path, compression='zstd')
+    return pq_path
+
+def _downcast(df):
+    """Halve numeric width (float64->float32, int64->int32); the aggregations here are memory-bound."""
+    for c in df.columns:
+        if df[c].dtype == np.float64:
+            df[c] = df[c].astype('float32')
+        elif df[c].dtype == np.int64:
+            df[c] = df[c].astype('int32')
+    return df
+
+# cache_resource: the frames are read-only downstream, so hand out the same
+# objects instead of re-hashing/copying them on every rerun
+@st.cache_resource
 def load_data():
-    marketing = pd.read_csv("marketing_cleaned_raw.csv", parse_dates=['date'])
-    daily_totals = pd.read_csv("daily_totals.csv", parse_dates=['date'])
-    daily_merged = pd.read_csv("daily_merged_business_marketing.csv", parse_dates=['date'])
+    marketing = _downcast(pd.read_parquet(_ensure_parquet("marketing_cleaned_raw.csv"), engine='pyarrow')).sort_values('date').reset_index(drop=True)
+    daily_totals = _downcast(pd.read_parquet(_ensure_parquet("daily_totals.csv"), engine='pyarrow')).sort_values('date').reset_index(drop=True)
+    daily_merged = _downcast(pd.read_parquet(_ensure_parquet("daily_merged_business_marketing.csv"), engine='pyarrow')).sort_values('date').reset_index(drop=True)
     channel_kpis = pd.read_csv("channel_level_kpis.csv")
-    return marketing, daily_totals, daily_merged, channel_kpis
-
-marketing, daily_totals, daily_merged, channel_kpis = load_data()
+    # dense date arrays for O(log N) range slicing in the filter block
+    date_arrays = tuple(df['date'].to_numpy().astype('datetime64[ns]') for df in (marketing, daily_totals, daily_merged))
+    return marketing, daily_totals, daily_merged, channel_kpis, date_arrays
+
+def _date_slice(df, dates, start, end):
+    """Slice a date-sorted frame to [start, end] via binary search (no full-length mask)."""
+    lo, hi = np.searchsorted(dates, [start.to_datetime64(), (end + pd.Timedelta('1D')).to_datetime64()])
+    return df.iloc[lo:hi]
+
+marketing, daily_totals, daily_merged, channel_kpis, (mkt_dates, dt_dates, dm_dates) = load_data()
+
+def _data_version():
+    """Cache-busting token for the aggregation caches: changes when the source parquet changes."""
+    return os.path.getmtime(_ensure_parquet("marketing_cleaned_raw.csv"))
+
+def _filter_marketing(start_iso, end_iso, channels_tup, state):
+    """Re-derive the filtered marketing slice from primitive keys (sorted slice + isin, cheap)."""
+    start, end = pd.Timestamp(start_iso), pd.Timestamp(end_iso)
+    df = _date_slice(marketing, mkt_dates, start, end)
+    df = df[df['channel'].isin(channels_tup)]
+    if state:
+        # integer compare on the category codes instead of a string compare per
+        # row; a state not present in the data short-circuits to an empty slice
+        cats = df['state'].cat.categories
+        if state in cats:
+            df = df.iloc[np.flatnonzero(df['state'].cat.codes.to_numpy() == cats.get_loc(state))]
+        else:
+            df = df.iloc[0:0]
+    return df
+
+@st.cache_resource
+def _duck():
+    """DuckDB connection with a view over the marketing parquet (predicate pushdown skips row groups)."""
+    con = duckdb.connect()
+    con.execute(f"CREATE VIEW mkt AS SELECT * FROM read_parquet('{_ensure_parquet('marketing_cleaned_raw.csv')}')")
+    return con
+
+# Cached aggregations: keyed by primitive filter values so identical reruns are
+# served from cache instead of re-running the groupbys on every widget change.
+@st.cache_data(max_entries=32)
+def channel_agg(start_iso, end_iso, channels_tup, state, version):
+    # pushed down to DuckDB over the parquet file: one vectorized scan computes
+    # the sums and the guarded ratios, instead of a pandas groupby per rerun
+    query = """
+        SELECT channel,
+               SUM(impressions) AS impressions,
+               SUM(clicks) AS clicks,
+               SUM(spend) AS spend,
+               SUM(attributed_revenue) AS attributed_revenue,
+               COUNT(DISTINCT campaign) AS campaigns,
+               COALESCE(SUM(clicks) / NULLIF(SUM(impressions), 0), 0) AS ctr,
+               COALESCE(SUM(spend) / NULLIF(SUM(clicks), 0), 0) AS cpc,
+               COALESCE(SUM(attributed_revenue) / NULLIF(SUM(spend), 0), 0) AS roas
+        FROM mkt
+        WHERE date BETWEEN ? AND ? AND list_contains(?, channel)
+    """
+    params = [start_iso, end_iso, list(channels_tup)]
+    if state:
+        query += " AND state = ?"
+        params.append(state)
+    query += " GROUP BY channel ORDER BY channel"
+    return _duck().cursor().execute(query, params).df()
+
+@st.cache_data(max_entries=32)
+def spend_pivot(start_iso, end_iso, channels_tup, state, version):
+    mkt_f = _filter_marketing(start_iso, end_iso, channels_tup, state)
+    # unstack fills zeros during construction — no NaN pivot + second fillna pass
+    ts_spend_pivot = mkt_f.groupby(['date','channel'], observed=True)['spend'].sum().unstack(fill_value=0)
+    ts_spend_pivot['total_spend'] = ts_spend_pivot.sum(axis=1)
+    return ts_spend_pivot.reset_index()
+
+@st.cache_data(max_entries=32)
+def campaign_roas(start_iso, end_iso, channels_tup, state, version):
+    mkt_f = _filter_marketing(start_iso, end_iso, channels_tup, state)
+    # dict agg keeps pandas on the fused single-scan groupby path instead of
+    # dispatching each named-agg column separately
+    agg = {'spend':'sum', 'attributed_revenue':'sum', 'impressions':'sum', 'clicks':'sum'}
+    camp = mkt_f.groupby(['channel','campaign'], observed=True).agg(agg).reset_index()
+    camp['roas'] = camp['attributed_revenue'] / camp['spend']
+    return camp
+
+# Download payloads: serialized once per filter set, not on every rerun after
+# the button renders.
+@st.cache_data(max_entries=8)
+def marketing_csv_bytes(start_iso, end_iso, channels_tup, state, version):
+    return _filter_marketing(start_iso, end_iso, channels_tup, state).to_csv(index=False).encode('utf-8')
+
+@st.cache_data(max_entries=8)
+def merged_csv_bytes(start_iso, end_iso, version):
+    dm_f = _date_slice(daily_merged, dm_dates, pd.Timestamp(start_iso), pd.Timestamp(end_iso))
+    return dm_f.to_csv(index=False).encode('utf-8')
+
+def maybe_downsample(df, x='date', max_points=500, how='sum'):
+    """Resample a daily series to <= ~max_points rows before charting.
+
+    Plotly serializes every row into the page as JSON, so for long date
+    ranges the browser payload/render cost dominates — aggregate server-side.
+    """
+    if len(df) <= max_points:
+        return df
+    rule = f"{len(df) // max_points}D"
+    return df.set_index(x).resample(rule).agg(how).reset_index()
 
 st.title("Marketing Intelligence Dashboard — Prototype (Overview)")
 st.markdown("Interactive prototype: KPI summary, spend vs revenue trends, and channel performance.")
@@ -34,12 +160,12 @@ if isinstance(date_range, list) or isinstance(date_range, tuple):
 else:
     start_date, end_date = pd.to_datetime(date_range), pd.to_datetime(date_range)
 
-# Filter data
-mkt_f = marketing[(marketing['date'] >= start_date) & (marketing['date'] <= end_date) & (marketing['channel'].isin(selected_channels))]
-dt_f = daily_totals[(daily_totals['date'] >= start_date) & (daily_totals['date'] <= end_date)]
-dm_f = daily_merged[(daily_merged['date'] >= start_date) & (daily_merged['date'] <= end_date)]
-if state_filter.strip():
-    mkt_f = mkt_f[mkt_f['state'] == state_filter.strip()]
+# Filter data (frames are pre-sorted by date, so the range filter is a contiguous slice)
+filter_key = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), tuple(selected_channels), state_filter.strip())
+data_version = _data_version()
+mkt_f = _filter_marketing(*filter_key)
+dt_f = _date_slice(daily_totals, dt_dates, start_date, end_date)
+dm_f = _date_slice(daily_merged, dm_dates, start_date, end_date)
 
 # KPIs row
 total_spend = mkt_f['spend'].sum()
@@ -60,42 +186,37 @@ st.markdown("---")
 # Time series: Spend (stacked by channel) vs Business Revenue
 st.subheader("Spend vs Revenue — time series")
 # prepare timeseries data
-ts_spend = mkt_f.groupby(['date','channel']).agg({'spend':'sum'}).reset_index()
-ts_spend_pivot = ts_spend.pivot(index='date', columns='channel', values='spend').fillna(0)
-ts_spend_pivot['total_spend'] = ts_spend_pivot.sum(axis=1)
-ts_spend_pivot = ts_spend_pivot.reset_index()
+ts_spend_pivot = spend_pivot(*filter_key, data_version)
 # business revenue series
 rev_ts = dm_f[['date','total_revenue']].groupby('date').sum().reset_index()
 
-fig = px.area(ts_spend_pivot, x='date', y=[c for c in ts_spend_pivot.columns if c not in ['date','total_spend']], title="Daily Ad Spend by Channel (stacked)")
+ts_spend_plot = maybe_downsample(ts_spend_pivot)
+fig = px.area(ts_spend_plot, x='date', y=[c for c in ts_spend_plot.columns if c not in ['date','total_spend']], title="Daily Ad Spend by Channel (stacked)")
 fig.update_layout(legend_title_text='Channel', height=350)
 st.plotly_chart(fig, use_container_width=True)
 
-fig2 = px.line(rev_ts, x='date', y='total_revenue', title="Daily Business Total Revenue", height=250)
+fig2 = px.line(maybe_downsample(rev_ts), x='date', y='total_revenue', title="Daily Business Total Revenue", height=250)
 st.plotly_chart(fig2, use_container_width=True)
 
 st.markdown("---")
 
 # Channel performance table
 st.subheader("Channel performance (selected date range)")
-channel_table = mkt_f.groupby('channel').agg(
-    impressions = ('impressions','sum'),
-    clicks = ('clicks','sum'),
-    spend = ('spend','sum'),
-    attributed_revenue = ('attributed_revenue','sum'),
-    campaigns = ('campaign', 'nunique')
-).reset_index()
-channel_table['ctr'] = channel_table['clicks'] / channel_table['impressions']
-channel_table['cpc'] = channel_table['spend'] / channel_table['clicks']
-channel_table['roas'] = channel_table['attributed_revenue'] / channel_table['spend']
+channel_table = channel_agg(*filter_key, data_version)
 
 st.dataframe(channel_table.sort_values('spend', ascending=False).round(3), height=300)
 
 # Top campaigns by ROAS
 st.subheader("Top campaigns by ROAS")
-camp = mkt_f.groupby(['channel','campaign']).agg(spend=('spend','sum'), attributed_revenue=('attributed_revenue','sum'), impressions=('impressions','sum'), clicks=('clicks','sum')).reset_index()
-camp['roas'] = camp['attributed_revenue'] / camp['spend']
-top_camp = camp.replace([np.inf, -np.inf], np.nan).dropna(subset=['roas']).sort_values('roas', ascending=False).head(15)
+camp = campaign_roas(*filter_key, data_version)
+# partial-select the top 15 (O(N)) instead of fully sorting every campaign
+finite_camp = camp[np.isfinite(camp['roas'].to_numpy())]
+k = min(15, len(finite_camp))
+if k:
+    idx = np.argpartition(-finite_camp['roas'].to_numpy(), k-1)[:k]
+    top_camp = finite_camp.iloc[idx].sort_values('roas', ascending=False)
+else:
+    top_camp = finite_camp
 st.dataframe(top_camp.round(3))
 
 st.markdown("---")
@@ -104,9 +225,9 @@ st.markdown("**Notes & assumptions:** The dashboard uses `attributed_revenue` fr
 # Export data
 st.sidebar.markdown("### Export")
 if st.sidebar.button("Download filtered marketing rows as CSV"):
-    st.download_button("Download marketing CSV", data=mkt_f.to_csv(index=False).encode('utf-8'), file_name="marketing_filtered.csv", mime="text/csv")
+    st.download_button("Download marketing CSV", data=marketing_csv_bytes(*filter_key, data_version), file_name="marketing_filtered.csv", mime="text/csv")
 
 if st.sidebar.button("Download daily merged business+marketing"):
-    st.download_button("Download merged CSV", data=dm_f.to_csv(index=False).encode('utf-8'), file_name="daily_merged_filtered.csv", mime="text/csv")
+    st.download_button("Download merged CSV", data=merged_csv_bytes(filter_key[0], filter_key[1], data_version), file_name="daily_merged_filtered.csv", mime="text/csv")
 
 st.sidebar.markdown("App created as part of an industry-level assignment prototype.")
@@ -4,6 +4,7 @@ import numpy as np
 import plotly.express as px
 import os
 from datetime import timedelta
+from scipy.signal import fftconvolve
 
 st.set_page_config(layout="wide", page_title="Marketing Intelligence Dashboard (Enhanced)")
 
@@ -15,15 +16,122 @@ def local_path(filename):
     else:
         return filename
 
+def _ensure_parquet(csv_path):
+    """Convert a CSV to a sibling Parquet file once; return the Parquet path.
+
+    Parquet gives dictionary-encoded strings and compressed columnar reads,
+    so the cold load is far cheaper than re-parsing the CSV every time.
+    """
+    pq_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if not os.path.exists(pq_path):
+        df = pd.read_csv(csv_path, parse_dates=['date'])
+        df['date'] = df['date'].astype('datetime64[ns]')
+        cats = {c: 'category' for c in ('channel', 'campaign', 'state') if c in df.columns}
+        df.astype(cats).to_parquet(pq_path, compression='zstd')
+    return pq_path
+
+def _downcast(df):
+    """Halve numeric width (float64->float32, int64->int32); the aggregations here are memory-bound."""
+    for c in df.columns:
+        if df[c].dtype == np.float64:
+            df[c] = df[c].astype('float32')
+        elif df[c].dtype == np.int64:
+            df[c] = df[c].astype('int32')
+    return df
+
 # ---------------- Load data ----------------
-@st.cache_data
+# cache_resource: the frames are read-only downstream, so hand out the same
+# objects instead of re-hashing/copying them on every rerun
+@st.cache_resource
 def load_data():
-    marketing = pd.read_csv(local_path("marketing_cleaned_raw.csv"), parse_dates=['date'])
-    daily_totals = pd.read_csv(local_path("daily_totals.csv"), parse_dates=['date'])
-    daily_merged = pd.read_csv(local_path("daily_merged_business_marketing.csv"), parse_dates=['date'])
-    return marketing, daily_totals, daily_merged
-
-marketing, daily_totals, daily_merged = load_data()
+    marketing = _downcast(pd.read_parquet(_ensure_parquet(local_path("marketing_cleaned_raw.csv")), engine='pyarrow')).sort_values('date').reset_index(drop=True)
+    daily_totals = _downcast(pd.read_parquet(_ensure_parquet(local_path("daily_totals.csv")), engine='pyarrow')).sort_values('date').reset_index(drop=True)
+    daily_merged = _downcast(pd.read_parquet(_ensure_parquet(local_path("daily_merged_business_marketing.csv")), engine='pyarrow')).sort_values('date').reset_index(drop=True)
+    # dense date arrays for O(log N) range slicing in the filter block
+    date_arrays = tuple(df['date'].to_numpy().astype('datetime64[ns]') for df in (marketing, daily_totals, daily_merged))
+    return marketing, daily_totals, daily_merged, date_arrays
+
+def _date_slice(df, dates, start, end):
+    """Slice a date-sorted frame to [start, end] via binary search (no full-length mask)."""
+    lo, hi = np.searchsorted(dates, [start.to_datetime64(), (end + pd.Timedelta('1D')).to_datetime64()])
+    return df.iloc[lo:hi]
+
+marketing, daily_totals, daily_merged, (mkt_dates, dt_dates, dm_dates) = load_data()
+
+def _data_version():
+    """Cache-busting token for the aggregation caches: changes when the source parquet changes."""
+    return os.path.getmtime(_ensure_parquet(local_path("marketing_cleaned_raw.csv")))
+
+def _filter_marketing(start_iso, end_iso, channels_tup, state):
+    """Re-derive the filtered marketing slice from primitive keys (sorted slice + isin, cheap)."""
+    start, end = pd.Timestamp(start_iso), pd.Timestamp(end_iso)
+    df = _date_slice(marketing, mkt_dates, start, end)
+    df = df[df['channel'].isin(channels_tup)]
+    if state:
+        # integer compare on the category codes instead of a string compare per
+        # row; a state not present in the data short-circuits to an empty slice
+        cats = df['state'].cat.categories
+        if state in cats:
+            df = df.iloc[np.flatnonzero(df['state'].cat.codes.to_numpy() == cats.get_loc(state))]
+        else:
+            df = df.iloc[0:0]
+    return df
+
+# Cached aggregations: keyed by primitive filter values so identical reruns are
+# served from cache instead of re-running the groupbys on every widget change.
+@st.cache_data(max_entries=32)
+def spend_pivot(start_iso, end_iso, channels_tup, state, version):
+    mkt = _filter_marketing(start_iso, end_iso, channels_tup, state)
+    # unstack fills zeros during construction — no NaN pivot + second fillna pass
+    return mkt.groupby(['date','channel'], observed=True).spend.sum().unstack(fill_value=0).reset_index()
+
+@st.cache_data(max_entries=32)
+def cohort_attrib(start_iso, end_iso, channels_tup, state, version):
+    mkt = _filter_marketing(start_iso, end_iso, channels_tup, state)
+    dm = _date_slice(daily_merged, dm_dates, pd.Timestamp(start_iso), pd.Timestamp(end_iso))
+    rev_by_ch = mkt.groupby(['date','channel'], observed=True).attributed_revenue.sum().reset_index()
+    # per-day share via transform: no hash join against a per-date totals frame
+    rev_by_ch['rev_share'] = rev_by_ch['attributed_revenue'] / rev_by_ch.groupby('date')['attributed_revenue'].transform('sum')
+
+    merged = rev_by_ch.merge(dm[['date','new_customers']], on='date', how='left')
+    merged['new_customers_attrib'] = merged['rev_share'] * merged['new_customers'].fillna(0)
+
+    cohort = merged.groupby('channel', observed=True).agg(total_new_customers_attr=('new_customers_attrib','sum')).reset_index().sort_values('total_new_customers_attr', ascending=False)
+    return cohort, merged
+
+# Download payload: serialized once per filter set, not on every rerun after
+# the button renders.
+@st.cache_data(max_entries=8)
+def channel_kpis_csv(start_iso, end_iso, channels_tup, state, version):
+    mkt = _filter_marketing(start_iso, end_iso, channels_tup, state)
+    # dict agg keeps pandas on the fused single-scan groupby path instead of
+    # dispatching each named-agg column separately
+    agg = {'impressions':'sum', 'clicks':'sum', 'spend':'sum', 'attributed_revenue':'sum'}
+    df = mkt.groupby('channel', observed=True).agg(agg).reset_index()
+    return df.to_csv(index=False).encode('utf-8')
+
+def maybe_downsample(df, x='date', max_points=500, how='sum'):
+    """Resample a daily series to <= ~max_points rows before charting.
+
+    Plotly serializes every row into the page as JSON, so for long date
+    ranges the browser payload/render cost dominates — aggregate server-side.
+    """
+    if len(df) <= max_points:
+        return df
+    rule = f"{len(df) // max_points}D"
+    return df.set_index(x).resample(rule).agg(how).reset_index()
+
+def rolling7(a):
+    """7-day trailing mean via prefix sums — one O(N) numpy pass.
+
+    Matches Series.rolling(7, min_periods=1).mean() without pandas'
+    generic rolling-window machinery.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    c = np.concatenate([[0.0], np.cumsum(a)])
+    w = np.minimum(np.arange(1, len(a) + 1), 7)
+    s = c[1:] - c[np.maximum(np.arange(len(a)) - 6, 0)]
+    return s / w
 
 # ---------------- Sidebar & Filters ----------------
 st.sidebar.title("Navigation")
@@ -40,16 +148,12 @@ state_filter = st.sidebar.text_input("State (optional)")
 
 start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
 
-mkt = marketing[
-    (marketing['date'] >= start_date) &
-    (marketing['date'] <= end_date) &
-    (marketing['channel'].isin(selected_channels))
-].copy()
+filter_key = (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'), tuple(selected_channels), state_filter.strip())
+data_version = _data_version()
 
-dm = daily_merged[(daily_merged['date'] >= start_date) & (daily_merged['date'] <= end_date)].copy()
-
-if state_filter.strip():
-    mkt = mkt[mkt['state'] == state_filter.strip()]
+# no .copy(): the pages only read these slices, never mutate them
+mkt = _filter_marketing(*filter_key)
+dm = _date_slice(daily_merged, dm_dates, start_date, end_date)
 
 # ---------------- KPI calculation ----------------
 def calc_kpis(df):
@@ -58,9 +162,12 @@ def calc_kpis(df):
     return s, r, (r / s if s > 0 else np.nan)
 
 # ---------------- Pages ----------------
-if page == "Overview":
+# Each page is a fragment: widgets local to a page (e.g. the max-lag slider)
+# rerun only that fragment instead of the whole script.
+@st.fragment
+def render_overview(mkt, dm):
     st.title("Overview — KPIs & Trends")
-    
+
     total_spend, total_attr_rev, overall_roas = calc_kpis(mkt)
     total_business_rev = dm['total_revenue'].sum() if 'total_revenue' in dm.columns else np.nan
     total_gross_profit = dm['gross_profit'].sum() if 'gross_profit' in dm.columns else np.nan
@@ -74,21 +181,24 @@ if page == "Overview":
 
     st.markdown("---")
     st.subheader("Spend by Channel (stacked)")
-    ts_spend = mkt.groupby(['date','channel']).spend.sum().reset_index()
-    spend_pivot = ts_spend.pivot(index='date', columns='channel', values='spend').fillna(0).reset_index()
-    fig = px.area(spend_pivot, x='date', y=[c for c in spend_pivot.columns if c != 'date'], title='Daily Ad Spend by Channel (stacked)')
+    spend_pivot_df = spend_pivot(*filter_key, data_version)
+    spend_plot = maybe_downsample(spend_pivot_df)
+    fig = px.area(spend_plot, x='date', y=[c for c in spend_plot.columns if c != 'date'], title='Daily Ad Spend by Channel (stacked)')
     st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("Revenue vs Spend (7-day rolling)")
     rev_ts = dm[['date','total_revenue']].groupby('date').sum().reset_index()
-    rev_ts['rev_7d'] = rev_ts['total_revenue'].rolling(7, min_periods=1).mean()
-    spend_total = ts_spend.groupby('date').spend.sum().reset_index().rename(columns={'spend':'total_spend'})
-    spend_total['spend_7d'] = spend_total['total_spend'].rolling(7, min_periods=1).mean()
+    rev_ts['rev_7d'] = rolling7(rev_ts['total_revenue'])
+    spend_total = spend_pivot_df[['date']].copy()
+    spend_total['total_spend'] = spend_pivot_df.drop(columns='date').sum(axis=1)
+    spend_total['spend_7d'] = rolling7(spend_total['total_spend'])
     df_join = rev_ts.merge(spend_total, on='date', how='left').fillna(0)
-    fig2 = px.line(df_join, x='date', y=['rev_7d','spend_7d'], labels={'value':'Amount','variable':'Metric'}, title='7-day rolling: Revenue vs Spend')
+    # rolling means must be averaged (not summed) when downsampled
+    fig2 = px.line(maybe_downsample(df_join, how='mean'), x='date', y=['rev_7d','spend_7d'], labels={'value':'Amount','variable':'Metric'}, title='7-day rolling: Revenue vs Spend')
     st.plotly_chart(fig2, use_container_width=True)
 
-elif page == "Diagnostics & Lag Analysis":
+@st.fragment
+def render_diagnostics(mkt, dm):
     st.title("Diagnostics & Lag Analysis")
     st.markdown("This section estimates how ad spend leads or lags business orders (cross-correlation).")
 
@@ -103,21 +213,40 @@ elif page == "Diagnostics & Lag Analysis":
     max_lag = st.slider('Max lag days (both directions)', 0, 30, 14)
     results = []
 
+    # one shared daily index for every dense series on this page
+    full_idx = pd.date_range(start_date, end_date, freq='D')
+
+    # normalize the orders series once; each channel then needs a single FFT
+    # cross-correlation instead of (2*max_lag+1) shift/corrcoef passes
+    ords_arr = orders.set_index('date').reindex(full_idx, fill_value=0)['orders'].to_numpy(dtype=np.float64)
+    n = len(ords_arr)
+    ords_std = ords_arr.std()
+    ords_n = (ords_arr - ords_arr.mean()) / (ords_std if ords_std > 0 else 1.0)
+
+    # the correlation window cannot exceed the series length: clamp the
+    # requested lag so the xc slice and the lags axis always agree
+    eff_lag = min(max_lag, n - 1)
+    lags = list(range(-eff_lag, eff_lag+1))
+    if eff_lag < max_lag:
+        st.caption(f'Lag window capped at ±{eff_lag} days — the selected range only spans {n} days.')
+
+    # one pivot up front: each channel becomes a contiguous dense daily column,
+    # instead of a fresh mask + groupby + reindex per loop iteration
+    spend_mat = (mkt.groupby(['date','channel'], observed=True)['spend'].sum()
+                 .unstack(fill_value=0)
+                 .reindex(index=full_idx, columns=selected_channels, fill_value=0))
+
     for ch in selected_channels:
-        srs = mkt[mkt['channel'] == ch].groupby('date').spend.sum().reindex(pd.date_range(start_date, end_date), fill_value=0)
-        ords = orders.set_index('date').reindex(pd.date_range(start_date, end_date), fill_value=0)['orders']
-        lags = list(range(-max_lag, max_lag+1))
-        cors = []
+        spend_arr = spend_mat[ch].to_numpy(dtype=np.float64)
+        spend_std = spend_arr.std()
+        spend_n = (spend_arr - spend_arr.mean()) / ((spend_std if spend_std > 0 else 1.0) * n)
 
-        for lag in lags:
-            if lag < 0:
-                val = np.corrcoef(srs.shift(-lag).fillna(0), ords.fillna(0))[0,1]
-            else:
-                val = np.corrcoef(srs.fillna(0), ords.shift(lag).fillna(0))[0,1]
-            cors.append(val)
+        # full cross-correlation; index n-1+k holds corr(spend[t+k], orders[t])
+        xc = fftconvolve(spend_n, ords_n[::-1], mode='full')
+        cors = xc[n-1-eff_lag : n+eff_lag]
 
-        best_lag = lags[np.nanargmax(np.nan_to_num(cors, nan=-999))]
-        results.append({'channel': ch, 'best_lag_days': best_lag, 'max_corr': np.nanmax(cors)})
+        best_lag = lags[int(np.argmax(cors))]
+        results.append({'channel': ch, 'best_lag_days': best_lag, 'max_corr': float(cors.max())})
 
         st.subheader(f'Channel: {ch} — correlation by lag')
         dfc = pd.DataFrame({'lag': lags, 'corr': cors})
@@ -125,40 +254,27 @@ elif page == "Diagnostics & Lag Analysis":
 
     st.table(pd.DataFrame(results))
 
-elif page == "Cohort & Acquisition":
+@st.fragment
+def render_cohort(dm):
     st.title("Cohort & Acquisition Attribution (proportional)")
     st.markdown("We attribute daily new customers to channels proportionally based on that day's attributed_revenue by channel.")
 
     if 'new_customers' not in dm.columns:
         st.error('No new_customers column found in business data.')
     else:
-        rev_by_ch = mkt.groupby(['date','channel']).attributed_revenue.sum().reset_index()
-        total_rev_by_date = rev_by_ch.groupby('date').attributed_revenue.sum().reset_index().rename(columns={'attributed_revenue':'total_rev'})
-        merged = rev_by_ch.merge(total_rev_by_date, on='date', how='left')
-        merged['rev_share'] = merged['attributed_revenue'] / merged['total_rev']
-
-        cust = dm[['date','new_customers']].copy()
-        merged = merged.merge(cust, on='date', how='left').fillna(0)
-        merged['new_customers_attrib'] = merged['rev_share'] * merged['new_customers']
-
-        cohort = merged.groupby('channel').agg(total_new_customers_attr=('new_customers_attrib','sum')).reset_index().sort_values('total_new_customers_attr', ascending=False)
+        cohort, merged = cohort_attrib(*filter_key, data_version)
         st.table(cohort.round(1))
 
         st.markdown('Top daily-channel breakdown (sample)')
         st.dataframe(merged.sort_values(['date','rev_share'], ascending=[False,False]).head(50))
 
-elif page == "Export & Report":
+@st.fragment
+def render_export():
     st.title("Export & Report")
     st.markdown("Download datasets and a summary slide deck for stakeholders.")
 
     if st.button('Download channel-level KPIs CSV'):
-        df = mkt.groupby('channel').agg(
-            impressions=('impressions','sum'),
-            clicks=('clicks','sum'),
-            spend=('spend','sum'),
-            attributed_revenue=('attributed_revenue','sum')
-        ).reset_index()
-        st.download_button('Download KPIs', data=df.to_csv(index=False).encode('utf-8'), file_name='channel_kpis_export.csv')
+        st.download_button('Download KPIs', data=channel_kpis_csv(*filter_key, data_version), file_name='channel_kpis_export.csv')
 
     st.markdown('Download a short slide deck summarizing top-level findings.')
     pptx_path = local_path("marketing_summary_slides.pptx")
@@ -167,3 +283,12 @@ elif page == "Export & Report":
             st.download_button('Download Slides', f.read(), file_name='marketing_summary_slides.pptx')
     else:
         st.warning("marketing_summary_slides.pptx not found. Please upload it.")
+
+if page == "Overview":
+    render_overview(mkt, dm)
+elif page == "Diagnostics & Lag Analysis":
+    render_diagnostics(mkt, dm)
+elif page == "Cohort & Acquisition":
+    render_cohort(dm)
+elif page == "Export & Report":
+    render_export()